@@ -1,16 +1,22 @@
 """
 Stock quotes and other market data from Questrade API.
 """
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from decimal import Decimal
 import logging
+import threading
 import time
 
 import voluptuous as vol
 
-from homeassistant.const import CONF_CURRENCY
+from homeassistant.const import CONF_CURRENCY, EVENT_HOMEASSISTANT_START
 from homeassistant.components.sensor import PLATFORM_SCHEMA, ENTITY_ID_FORMAT
 from homeassistant.helpers.entity import Entity, generate_entity_id
+from homeassistant.helpers.event import track_time_interval
 import homeassistant.helpers.config_validation as cv
 from homeassistant.helpers.typing import HomeAssistantType
+import homeassistant.util.dt as dt_util
 from homeassistant.util.json import load_json, save_json
 
 REQUIREMENTS = ['requests==2.18.4']
@@ -20,11 +26,14 @@ DEPENDENCIES = ['http']
 _LOGGER = logging.getLogger(__name__)
 
 QUESTRADE_CONFIG_PATH = 'questrade.conf'
+QUESTRADE_LEDGER_PATH = 'questrade_ledger.json'
 
 CONF_CLIENT_ID = 'client_id'
 CONF_REFRESH_TOKEN = 'refresh_token'
+CONF_LEDGER_START = 'ledger_start'
 
 DEFAULT_CURRENCY = 'CAD'
+SUPPORTED_CURRENCIES = ['CAD', 'USD']
 
 ATTR_CASH = 'cash'
 ATTR_MARKET_VALUE = 'market_value'
@@ -36,6 +45,51 @@ ATTR_SOD_MARKET_VALUE = 'sod_market_value'
 ATTR_SOD_TOTAL_EQUITY = 'sod_total_equity'
 ATTR_SOD_BUYING_POWER = 'sod_buying_power'
 ATTR_SOD_MAINTENANCE_EXCESS = 'sod_maintenance_excess'
+ATTR_TODAY = 'today'
+ATTR_MONTH_TO_DATE = 'month_to_date'
+ATTR_YEAR_TO_DATE = 'year_to_date'
+ATTR_ALL_TIME = 'all_time'
+ATTR_BY_SYMBOL = 'by_symbol'
+ATTR_SYNCED_UNTIL = 'synced_until'
+ATTR_CURRENCIES = 'currencies'
+ATTR_EXCHANGE_RATES = 'exchange_rates'
+ATTR_ACCOUNTS = 'accounts'
+
+PORTFOLIO_NAME = 'Questrade Portfolio'
+
+# Norbert's gambit pair listed in both currencies; the ratio of their prices
+# gives the USD/CAD rate from Questrade quotes.
+FX_SYMBOL_CAD = 'DLR.TO'
+FX_SYMBOL_USD = 'DLR.U.TO'
+
+LEDGER_REALIZED_PNL = 'realized_pnl'
+LEDGER_DIVIDENDS = 'dividends'
+LEDGER_CONTRIBUTIONS = 'contributions'
+
+LEDGER_NAMES = {
+    LEDGER_REALIZED_PNL: 'Realized P&L',
+    LEDGER_DIVIDENDS: 'Dividends',
+    LEDGER_CONTRIBUTIONS: 'Contributions',
+}
+
+# Questrade rejects activity and execution queries spanning more than a
+# month, so history is walked in windows of this size.
+LEDGER_WINDOW = timedelta(days=30)
+# Bounds the number of windows fetched per account on each sync so that a
+# multi-year backfill is spread over several syncs and stays well within the
+# API rate limits.
+LEDGER_WINDOWS_PER_SYNC = 12
+# Seconds to wait between windows.
+LEDGER_REQUEST_DELAY = 1
+# Questrade posts activities overnight or the next business day, so the last
+# few days are fetched again on every sync.
+LEDGER_LOOKBACK = timedelta(days=4)
+
+LEDGER_SYNC_INTERVAL = timedelta(minutes=15)
+
+# Trade actions opening a short position. Other sales without a known
+# position are of shares acquired before the start of the ledger.
+SHORT_ACTIONS = ('Short', 'STO')
 
 ICON_TRENDING_UP = 'mdi:trending-up'
 ICON_TRENDING_DOWN = 'mdi:trending-down'
@@ -43,16 +97,25 @@ ICON_TRENDING_DOWN = 'mdi:trending-down'
 PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend({
     vol.Required(CONF_CLIENT_ID): cv.string,
     vol.Required(CONF_REFRESH_TOKEN): cv.string,
-    vol.Optional(CONF_CURRENCY): cv.string,
+    vol.Optional(CONF_CURRENCY): vol.In(SUPPORTED_CURRENCIES),
+    vol.Optional(CONF_LEDGER_START): cv.date,
 })
 
 
+class QuestradeRateLimitError(Exception):
+    """The API rate limit was reached."""
+
+    def __init__(self, reset):
+        super().__init__('Rate limit reached')
+        self.reset = reset
+
+
 class QuestradeClient:
     def __init__(self, hass, client_id, token):
         self.hass = hass
         self._token = token
 
-    def _request(self, resource):
+    def _request(self, resource, params=None):
         import requests
         if 'access_token' not in self._token:
             self._fetch_token(self._token)
@@ -64,7 +127,11 @@ class QuestradeClient:
         headers = {
             'Authorization': 'Bearer %s' % self._token['access_token']
         }
-        return requests.get(url, headers=headers).json()
+        response = requests.get(url, headers=headers, params=params)
+        if response.status_code == 429:
+            raise QuestradeRateLimitError(
+                int(response.headers.get('X-RateLimit-Reset', 0)))
+        return response.json()
 
     def _fetch_token(self, token):
         import requests
@@ -85,6 +152,27 @@ class QuestradeClient:
     def get_account_balances(self, account_id):
         return self._request('accounts/%s/balances' % account_id)
 
+    def get_account_activities(self, account_id, start_time, end_time):
+        params = {
+            'startTime': start_time.isoformat(),
+            'endTime': end_time.isoformat(),
+        }
+        return self._request('accounts/%s/activities' % account_id, params)
+
+    def get_account_executions(self, account_id, start_time, end_time):
+        params = {
+            'startTime': start_time.isoformat(),
+            'endTime': end_time.isoformat(),
+        }
+        return self._request('accounts/%s/executions' % account_id, params)
+
+    def get_symbols(self, names):
+        return self._request('symbols', {'names': ','.join(names)})
+
+    def get_quotes(self, symbol_ids):
+        return self._request(
+            'markets/quotes', {'ids': ','.join(map(str, symbol_ids))})
+
 
 def setup_platform(hass, config, add_devices, discovery_info=None):
     client_id = config.get(CONF_CLIENT_ID)
@@ -99,15 +187,397 @@ def setup_platform(hass, config, add_devices, discovery_info=None):
         for account in response['accounts']
         if account['status'] == 'Active'
     ]
+    portfolio = QuestradePortfolio(client, currency)
     dev = []
     for account_id, name in accounts:
-        dev.append(QuestradeSensor(hass, client, account_id, name, currency))
+        dev.append(QuestradeSensor(
+            hass, client, account_id, name, currency, portfolio))
+    ledger_start = config.get(CONF_LEDGER_START)
+    if ledger_start is not None:
+        ledger = QuestradeLedger(
+            hass, client, [account_id for account_id, _ in accounts],
+            ledger_start)
+        for account_id, name in accounts:
+            for kind in LEDGER_NAMES:
+                dev.append(QuestradeLedgerSensor(
+                    hass, ledger, account_id, name, kind, currency))
+
+        def start_ledger_sync(event):
+            ledger.update()
+            track_time_interval(hass, ledger.update, LEDGER_SYNC_INTERVAL)
+
+        # The backfill can take a while, so it is not done during setup.
+        if hass.is_running:
+            hass.add_job(start_ledger_sync, None)
+        else:
+            hass.bus.listen_once(EVENT_HOMEASSISTANT_START, start_ledger_sync)
+    dev.append(QuestradePortfolioSensor(hass, portfolio))
     add_devices(dev, True)
 
 
+def _start_of_local_day(day):
+    return dt_util.start_of_local_day(
+        datetime.combine(day, datetime.min.time()))
+
+
+def _activity_identity(activity):
+    return tuple(activity.get(key) for key in (
+        'tradeDate', 'transactionDate', 'type', 'symbol', 'action',
+        'quantity', 'netAmount'))
+
+
+def _execution_identity(execution):
+    return execution['id']
+
+
+def _realized_pnl(trades):
+    """Compute realized gains from chronological trade activities.
+
+    Uses the average cost method. The net amount of each trade includes
+    commissions, and short positions are handled symmetrically to long ones.
+    Sales without a known position are skipped since their cost is unknown.
+    Yields (date, symbol, currency, amount) for each closing trade.
+    """
+    positions = {}
+    for date, activity in trades:
+        quantity = activity['quantity']
+        cash = activity['netAmount']
+        if not quantity:
+            continue
+        symbol = activity['symbol']
+        currency = activity['currency']
+        position, cost = positions.get((symbol, currency), (0, 0.0))
+        if position * quantity < 0:
+            closing = min(abs(quantity), abs(position))
+            basis = cost * closing / abs(position)
+            proceeds = cash * closing / abs(quantity)
+            yield date, symbol, currency, proceeds - basis
+            position += closing if position < 0 else -closing
+            cost -= basis
+            cash -= proceeds
+            quantity += closing if quantity < 0 else -closing
+        if quantity < 0 and not position and \
+                activity['action'] not in SHORT_ACTIONS:
+            _LOGGER.warning(
+                'Skipping sale of %s %s on %s without a known position',
+                -quantity, symbol, date)
+        elif quantity:
+            position += quantity
+            cost -= cash
+        positions[(symbol, currency)] = (position, cost)
+
+
+class QuestradePortfolio:
+    """Household totals over the currency buckets of every account.
+
+    Each account sensor hands over the balances it already fetched, and the
+    per-currency totals are adjusted by the difference with that account's
+    previous balances, so the aggregate never needs another pass over all
+    accounts. Amounts are kept as decimals to avoid accumulating float errors.
+    """
+
+    def __init__(self, questrade_client, currency):
+        self._client = questrade_client
+        self.currency = currency
+        self.balances = {}
+        self.totals = {}
+        self._fx_date = None
+        self._usd_cad = None
+        self._implied_usd_cad = None
+        self.lock = threading.RLock()
+        self.sensor = None
+
+    def update_account(self, account_id, response):
+        if 'perCurrencyBalances' not in response:
+            _LOGGER.warning('No balances for account %s: %s',
+                            account_id, response.get('message'))
+            return
+        balances = {}
+        for balance in response['perCurrencyBalances']:
+            balances[balance['currency']] = {
+                key: Decimal(str(balance[key]))
+                for key in ('cash', 'marketValue', 'totalEquity')
+            }
+        # Questrade restates the whole account in each currency in the
+        # combined balances, which gives its own rate as a fallback.
+        combined = {
+            balance['currency']: balance['totalEquity']
+            for balance in response.get('combinedBalances', [])
+        }
+
+        with self.lock:
+            for sign, buckets in ((-1, self.balances.get(account_id, {})),
+                                  (1, balances)):
+                for currency, values in buckets.items():
+                    total = self.totals.setdefault(
+                        currency, dict.fromkeys(values, Decimal(0)))
+                    for key, value in values.items():
+                        total[key] += sign * value
+            self.balances[account_id] = balances
+            if combined.get('CAD') and combined.get('USD'):
+                self._implied_usd_cad = Decimal(str(combined['CAD'])) / \
+                    Decimal(str(combined['USD']))
+
+        if self.sensor is not None:
+            self.sensor.update()
+            self.sensor.schedule_update_ha_state()
+
+    def convert(self):
+        """Convert the totals to the portfolio currency.
+
+        Returns the converted totals, the total equity of each currency, the
+        exchange rates used, and the currencies with a balance but no known
+        rate.
+        """
+        with self.lock:
+            rates = self._exchange_rates()
+            totals = dict.fromkeys(
+                ('cash', 'marketValue', 'totalEquity'), Decimal(0))
+            missing = []
+            for currency, values in self.totals.items():
+                if currency not in rates:
+                    if any(values.values()):
+                        missing.append(currency)
+                    continue
+                for key in totals:
+                    totals[key] += values[key] * rates[currency]
+            currencies = {
+                currency: values['totalEquity']
+                for currency, values in self.totals.items()
+            }
+            return totals, currencies, rates, missing
+
+    def update_exchange_rate(self):
+        """Fetch the USD/CAD rate once per day.
+
+        A failed fetch is not retried until the next day; the rate implied
+        by the combined balances is used instead.
+        """
+        today = dt_util.now().date()
+        with self.lock:
+            if self._fx_date == today:
+                return
+            self._fx_date = today
+        try:
+            usd_cad = self._fetch_usd_cad()
+        except (OSError, ValueError, KeyError,
+                QuestradeRateLimitError) as err:
+            _LOGGER.warning('Unable to fetch the exchange rate: %s', err)
+            usd_cad = None
+        with self.lock:
+            self._usd_cad = usd_cad
+
+    def _exchange_rates(self):
+        """Rates converting each currency to the portfolio currency."""
+        usd_cad = self._usd_cad or self._implied_usd_cad
+        if usd_cad is None:
+            return {self.currency: Decimal(1)}
+        if self.currency == 'USD':
+            return {'USD': Decimal(1), 'CAD': 1 / usd_cad}
+        return {'CAD': Decimal(1), 'USD': usd_cad}
+
+    def _fetch_usd_cad(self):
+        response = self._client.get_symbols([FX_SYMBOL_CAD, FX_SYMBOL_USD])
+        symbol_ids = {
+            symbol['symbol']: symbol['symbolId']
+            for symbol in response.get('symbols', [])
+        }
+        if FX_SYMBOL_CAD not in symbol_ids or FX_SYMBOL_USD not in symbol_ids:
+            _LOGGER.warning('Unable to find exchange rate symbols: %s',
+                            response.get('message'))
+            return None
+        response = self._client.get_quotes(symbol_ids.values())
+        prices = {
+            quote['symbol']: quote['lastTradePrice']
+            for quote in response.get('quotes', [])
+        }
+        if not prices.get(FX_SYMBOL_CAD) or not prices.get(FX_SYMBOL_USD):
+            _LOGGER.warning('Unable to fetch exchange rate quotes: %s',
+                            response.get('message'))
+            return None
+        return Decimal(str(prices[FX_SYMBOL_CAD])) / \
+            Decimal(str(prices[FX_SYMBOL_USD]))
+
+
+class QuestradeLedger:
+    """Local ledger of account activities and executions.
+
+    Entries are persisted by account and trade date along with a per-account
+    cursor, so that a backfill interrupted by a restart resumes where it
+    stopped. Once caught up, each sync only fetches the last few days.
+    """
+
+    def __init__(self, hass, questrade_client, account_ids, start_date):
+        self._client = questrade_client
+        self._path = hass.config.path(QUESTRADE_LEDGER_PATH)
+        self._data = load_json(self._path) or {}
+        self._accounts = self._data.setdefault('accounts', {})
+        self._account_ids = list(account_ids)
+        for account_id in account_ids:
+            self._accounts.setdefault(account_id, {
+                'cursor': start_date.isoformat(),
+                'activities': {},
+                'executions': {},
+            })
+        self._index = {}
+        self._lock = threading.Lock()
+        self._retry_at = 0
+        self._build_index(self._account_ids)
+
+    def synced_until(self, account_id):
+        return self._accounts[account_id]['cursor']
+
+    def total(self, account_id, kind, currency, start=None, end=None,
+              symbol=None):
+        """Sum the ledger entries of a kind over [start, end) dates."""
+        dates, entries = self._index.get(
+            (account_id, kind, currency, symbol), ([], []))
+        lo = 0 if start is None else bisect_left(dates, start.isoformat())
+        hi = len(dates) if end is None else \
+            bisect_left(dates, end.isoformat())
+        return round(sum(entries[lo:hi]), 2)
+
+    def currencies(self, account_id, kind):
+        return sorted(
+            cur for (account, k, cur, symbol) in self._index
+            if account == account_id and k == kind and symbol is None)
+
+    def symbols(self, account_id, kind, currency):
+        return sorted(
+            symbol for (account, k, cur, symbol) in self._index
+            if account == account_id and k == kind and cur == currency
+            and symbol is not None)
+
+    def update(self, now=None):
+        if not self._lock.acquire(False):
+            return
+        try:
+            if self._retry_at > time.time():
+                return
+            changed = set()
+            try:
+                self._sync(changed)
+            finally:
+                if changed:
+                    save_json(self._path, self._data)
+                    self._build_index(changed)
+        finally:
+            self._lock.release()
+
+    def _sync(self, changed):
+        """Fetch the pending windows of each account.
+
+        Accounts whose entries changed are added to the changed set.
+        """
+        today = dt_util.now().date()
+        try:
+            for account_id in self._account_ids:
+                for _ in range(LEDGER_WINDOWS_PER_SYNC):
+                    if not self._sync_window(account_id, today, changed):
+                        break
+                    time.sleep(LEDGER_REQUEST_DELAY)
+        except QuestradeRateLimitError as err:
+            _LOGGER.warning('Rate limit reached, pausing the ledger sync')
+            self._retry_at = err.reset
+
+    def _sync_window(self, account_id, today, changed):
+        """Fetch the window starting at the cursor of an account.
+
+        Returns True if more recent windows remain to be fetched.
+        """
+        account = self._accounts[account_id]
+        start = dt_util.parse_date(account['cursor'])
+        end = min(start + LEDGER_WINDOW, today + timedelta(days=1))
+        start_time = _start_of_local_day(start)
+        end_time = _start_of_local_day(end)
+        activities = self._client.get_account_activities(
+            account_id, start_time, end_time)
+        executions = self._client.get_account_executions(
+            account_id, start_time, end_time)
+        if 'activities' not in activities or 'executions' not in executions:
+            _LOGGER.warning(
+                'Unable to fetch activities for account %s: %s',
+                account_id, activities.get('message') or
+                executions.get('message'))
+            return False
+        if self._merge(account['activities'], activities['activities'],
+                       'tradeDate', _activity_identity):
+            changed.add(account_id)
+        if self._merge(account['executions'], executions['executions'],
+                       'timestamp', _execution_identity):
+            changed.add(account_id)
+        # The last few days are fetched again on the next syncs since their
+        # activities may not be posted yet.
+        cursor = max(start, min(end, today - LEDGER_LOOKBACK)).isoformat()
+        if cursor != account['cursor']:
+            account['cursor'] = cursor
+            changed.add(account_id)
+        return end <= today
+
+    @staticmethod
+    def _merge(entries, fetched, date_key, identity):
+        """Merge fetched entries, replacing those already in the ledger.
+
+        The window Questrade filters on does not always match the date the
+        entries are stored under, so entries are matched by identity rather
+        than by date range. Returns True if the ledger changed.
+        """
+        by_date = {}
+        for entry in fetched:
+            by_date.setdefault(entry[date_key][:10], []).append(entry)
+        changed = False
+        for date, new in by_date.items():
+            keys = {identity(entry) for entry in new}
+            existing = entries.get(date, [])
+            replaced = [entry for entry in existing if identity(entry) in keys]
+            if replaced == new:
+                continue
+            entries[date] = [
+                entry for entry in existing if identity(entry) not in keys
+            ] + new
+            changed = True
+        return changed
+
+    def _build_index(self, account_ids):
+        """Rebuild the index entries of the given accounts."""
+        index = {
+            key: value for key, value in self._index.items()
+            if key[0] not in account_ids
+        }
+
+        def add(account_id, kind, date, symbol, currency, amount):
+            keys = [(account_id, kind, currency, None)]
+            if symbol:
+                keys.append((account_id, kind, currency, symbol))
+            for key in keys:
+                dates, amounts = index.setdefault(key, ([], []))
+                dates.append(date)
+                amounts.append(amount)
+
+        for account_id in account_ids:
+            account = self._accounts[account_id]
+            trades = []
+            for date in sorted(account['activities']):
+                for activity in account['activities'][date]:
+                    if activity['type'] == 'Trades':
+                        trades.append((date, activity))
+                    elif activity['type'] == 'Dividends':
+                        add(account_id, LEDGER_DIVIDENDS, date,
+                            activity['symbol'], activity['currency'],
+                            activity['netAmount'])
+                    elif activity['type'] in ('Deposits', 'Withdrawals'):
+                        add(account_id, LEDGER_CONTRIBUTIONS, date, None,
+                            activity['currency'], activity['netAmount'])
+            for date, symbol, currency, amount in _realized_pnl(trades):
+                add(account_id, LEDGER_REALIZED_PNL, date, symbol, currency,
+                    amount)
+        self._index = index
+
+
 class QuestradeSensor(Entity):
-    def __init__(self, hass: HomeAssistantType, questrade_client, account_id, name, currency):
+    def __init__(self, hass: HomeAssistantType, questrade_client, account_id, name, currency, portfolio):
         self._client = questrade_client
+        self._portfolio = portfolio
         self._name = name
         self.account_id = account_id
         self.currency = currency
@@ -179,3 +649,162 @@ class QuestradeSensor(Entity):
             self.sod_total_equity = balance['totalEquity']
             self.sod_buying_power = balance['buyingPower']
             self.sod_maintenance_excess = balance['maintenanceExcess']
+        self._portfolio.update_account(self.account_id, response)
+
+
+class QuestradeLedgerSensor(Entity):
+    def __init__(self, hass: HomeAssistantType, ledger, account_id, name, kind, currency):
+        self._ledger = ledger
+        self._name = '%s %s' % (name, LEDGER_NAMES[kind])
+        self.account_id = account_id
+        self.kind = kind
+        self.currency = currency
+        self.today = None
+        self.month_to_date = None
+        self.year_to_date = None
+        self.all_time = None
+        self.by_symbol = None
+        self.currencies = None
+        self.synced_until = None
+        self.entity_id = generate_entity_id(
+            ENTITY_ID_FORMAT, "questrade_%s_%s" % (account_id, kind), hass=hass)
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def unit_of_measurement(self):
+        return self.currency
+
+    @property
+    def state(self):
+        if self.year_to_date is None:
+            return 0
+        return self.year_to_date
+
+    @property
+    def device_state_attributes(self):
+        return {
+            ATTR_TODAY: self.today,
+            ATTR_MONTH_TO_DATE: self.month_to_date,
+            ATTR_YEAR_TO_DATE: self.year_to_date,
+            ATTR_ALL_TIME: self.all_time,
+            ATTR_BY_SYMBOL: self.by_symbol,
+            ATTR_CURRENCIES: self.currencies,
+            ATTR_SYNCED_UNTIL: self.synced_until,
+        }
+
+    @property
+    def icon(self):
+        if self.year_to_date is not None and self.year_to_date < 0:
+            return ICON_TRENDING_DOWN
+        return ICON_TRENDING_UP
+
+    def update(self):
+        today = dt_util.now().date()
+        tomorrow = today + timedelta(days=1)
+        start_of_year = today.replace(month=1, day=1)
+
+        def total(start, currency=self.currency, symbol=None):
+            return self._ledger.total(
+                self.account_id, self.kind, currency, start, tomorrow,
+                symbol)
+
+        self.today = total(today)
+        self.month_to_date = total(today.replace(day=1))
+        self.year_to_date = total(start_of_year)
+        self.all_time = total(None)
+        self.by_symbol = {
+            symbol: total(start_of_year, symbol=symbol)
+            for symbol in self._ledger.symbols(
+                self.account_id, self.kind, self.currency)
+        } or None
+        self.currencies = {
+            currency: {
+                ATTR_TODAY: total(today, currency),
+                ATTR_MONTH_TO_DATE: total(today.replace(day=1), currency),
+                ATTR_YEAR_TO_DATE: total(start_of_year, currency),
+                ATTR_ALL_TIME: total(None, currency),
+            }
+            for currency in self._ledger.currencies(
+                self.account_id, self.kind)
+        } or None
+        self.synced_until = self._ledger.synced_until(self.account_id)
+
+
+class QuestradePortfolioSensor(Entity):
+    def __init__(self, hass: HomeAssistantType, portfolio):
+        self._portfolio = portfolio
+        self.currency = portfolio.currency
+        self.total_equity = None
+        self.cash = None
+        self.market_value = None
+        self.currencies = None
+        self.exchange_rates = None
+        self.accounts = None
+        self._available = True
+        self.entity_id = generate_entity_id(
+            ENTITY_ID_FORMAT, "questrade_portfolio", hass=hass)
+
+    async def async_added_to_hass(self):
+        """Receive the balances of each account once added."""
+        self._portfolio.sensor = self
+        self.async_schedule_update_ha_state(True)
+
+    @property
+    def name(self):
+        return PORTFOLIO_NAME
+
+    @property
+    def should_poll(self):
+        return False
+
+    @property
+    def available(self):
+        return self._available
+
+    @property
+    def unit_of_measurement(self):
+        return self.currency
+
+    @property
+    def state(self):
+        if self.total_equity is None:
+            return 0
+        return self.total_equity
+
+    @property
+    def device_state_attributes(self):
+        return {
+            ATTR_CASH: self.cash,
+            ATTR_MARKET_VALUE: self.market_value,
+            ATTR_TOTAL_EQUITY: self.total_equity,
+            ATTR_CURRENCIES: self.currencies,
+            ATTR_EXCHANGE_RATES: self.exchange_rates,
+            ATTR_ACCOUNTS: self.accounts,
+        }
+
+    @property
+    def icon(self):
+        return ICON_TRENDING_UP
+
+    def update(self):
+        self._portfolio.update_exchange_rate()
+        with self._portfolio.lock:
+            totals, currencies, rates, missing = self._portfolio.convert()
+            if missing:
+                _LOGGER.warning('No exchange rate for %s', ', '.join(missing))
+            self._available = not missing
+            self.cash = float(round(totals['cash'], 2))
+            self.market_value = float(round(totals['marketValue'], 2))
+            self.total_equity = float(round(totals['totalEquity'], 2))
+            self.currencies = {
+                currency: float(round(total, 2))
+                for currency, total in currencies.items()
+            }
+            self.exchange_rates = {
+                currency: float(round(rate, 6))
+                for currency, rate in rates.items()
+            }
+            self.accounts = len(self._portfolio.balances)
@@ -0,0 +1,494 @@
+from datetime import timedelta
+from decimal import Decimal
+import time
+from unittest.mock import MagicMock, patch
+
+from custom_components.questrade import sensor as questrade
+from homeassistant.const import EVENT_HOMEASSISTANT_START
+from homeassistant.setup import async_setup_component
+import homeassistant.util.dt as dt_util
+
+import homeassistant.components.sensor as sensor
+
+
+def trade(date, quantity, net_amount, action=None, symbol='XYZ'):
+    if action is None:
+        action = 'Buy' if quantity > 0 else 'Sell'
+    return (date, {
+        'type': 'Trades',
+        'action': action,
+        'symbol': symbol,
+        'currency': 'CAD',
+        'quantity': quantity,
+        'netAmount': net_amount,
+    })
+
+
+def activity(date, type_, net_amount, symbol='', currency='CAD'):
+    return {
+        'tradeDate': date + 'T00:00:00.000000-05:00',
+        'type': type_,
+        'action': '',
+        'symbol': symbol,
+        'currency': currency,
+        'quantity': 0,
+        'netAmount': net_amount,
+    }
+
+
+def create_ledger(hass, tmpdir, client, start_date):
+    hass.config.config_dir = str(tmpdir)
+    return questrade.QuestradeLedger(hass, client, ['1'], start_date)
+
+
+def balances(per_currency, combined=()):
+    def balance(currency, total_equity):
+        return {
+            'currency': currency,
+            'cash': total_equity,
+            'marketValue': 0,
+            'totalEquity': total_equity,
+        }
+
+    return {
+        'perCurrencyBalances': [balance(*item) for item in per_currency],
+        'combinedBalances': [balance(*item) for item in combined],
+    }
+
+
+def create_quoting_client(cad_price=13.7, usd_price=10.0):
+    client = MagicMock()
+    client.get_symbols.return_value = {
+        'symbols': [
+            {'symbol': 'DLR.TO', 'symbolId': 1},
+            {'symbol': 'DLR.U.TO', 'symbolId': 2},
+        ],
+    }
+    client.get_quotes.return_value = {
+        'quotes': [
+            {'symbol': 'DLR.TO', 'lastTradePrice': cad_price},
+            {'symbol': 'DLR.U.TO', 'lastTradePrice': usd_price},
+        ],
+    }
+    return client
+
+
+def create_client(activities=()):
+    client = MagicMock()
+    client.get_account_activities.return_value = {
+        'activities': list(activities),
+    }
+    client.get_account_executions.return_value = {'executions': []}
+    return client
+
+
+def test_realized_pnl_long():
+    trades = [
+        trade('2019-01-01', 10, -1000),
+        trade('2019-01-02', 10, -1200),
+        trade('2019-01-03', -5, 600),
+        trade('2019-01-04', -15, 1800),
+    ]
+    assert list(questrade._realized_pnl(trades)) == [
+        ('2019-01-03', 'XYZ', 'CAD', 50.0),
+        ('2019-01-04', 'XYZ', 'CAD', 150.0),
+    ]
+
+
+def test_realized_pnl_short():
+    trades = [
+        trade('2019-01-01', -10, 1000, 'Short'),
+        trade('2019-01-02', 4, -320),
+        trade('2019-01-03', 6, -660),
+    ]
+    assert list(questrade._realized_pnl(trades)) == [
+        ('2019-01-02', 'XYZ', 'CAD', 80.0),
+        ('2019-01-03', 'XYZ', 'CAD', -60.0),
+    ]
+
+
+def test_realized_pnl_reversal():
+    trades = [
+        trade('2019-01-01', 10, -1000),
+        trade('2019-01-02', -20, 2400, 'Short'),
+        trade('2019-01-03', 10, -1000),
+    ]
+    assert list(questrade._realized_pnl(trades)) == [
+        ('2019-01-02', 'XYZ', 'CAD', 200.0),
+        ('2019-01-03', 'XYZ', 'CAD', 200.0),
+    ]
+
+
+def test_realized_pnl_sale_without_position():
+    trades = [
+        trade('2019-01-01', 10, -1000),
+        trade('2019-01-02', -15, 1800),
+        trade('2019-01-03', -10, 1000, symbol='ABC'),
+        trade('2019-01-04', 10, -900, symbol='ABC'),
+        trade('2019-01-05', -10, 1100, symbol='ABC'),
+    ]
+    assert list(questrade._realized_pnl(trades)) == [
+        ('2019-01-02', 'XYZ', 'CAD', 200.0),
+        ('2019-01-05', 'ABC', 'CAD', 200.0),
+    ]
+
+
+@patch.object(questrade, 'LEDGER_REQUEST_DELAY', 0)
+def test_ledger_windows_per_sync(hass, tmpdir):
+    client = create_client()
+    start_date = dt_util.now().date() - timedelta(days=1000)
+    ledger = create_ledger(hass, tmpdir, client, start_date)
+    ledger.update()
+
+    assert client.get_account_activities.call_count == \
+        questrade.LEDGER_WINDOWS_PER_SYNC
+    assert client.get_account_executions.call_count == \
+        questrade.LEDGER_WINDOWS_PER_SYNC
+    synced_until = start_date + \
+        questrade.LEDGER_WINDOWS_PER_SYNC * questrade.LEDGER_WINDOW
+    assert ledger.synced_until('1') == synced_until.isoformat()
+
+
+@patch.object(questrade, 'LEDGER_REQUEST_DELAY', 0)
+def test_ledger_resumes_from_cursor(hass, tmpdir):
+    client = create_client()
+    start_date = dt_util.now().date() - timedelta(days=1000)
+    create_ledger(hass, tmpdir, client, start_date).update()
+    cursor = start_date + \
+        questrade.LEDGER_WINDOWS_PER_SYNC * questrade.LEDGER_WINDOW
+
+    client.reset_mock()
+    ledger = create_ledger(hass, tmpdir, client, start_date)
+    assert ledger.synced_until('1') == cursor.isoformat()
+
+    ledger.update()
+    _, start_time, _ = client.get_account_activities.call_args_list[0][0]
+    assert start_time == questrade._start_of_local_day(cursor)
+
+
+@patch.object(questrade, 'LEDGER_REQUEST_DELAY', 0)
+def test_ledger_fetches_newest_window(hass, tmpdir):
+    client = create_client()
+    today = dt_util.now().date()
+    lookback = today - questrade.LEDGER_LOOKBACK
+    ledger = create_ledger(hass, tmpdir, client, today - timedelta(days=10))
+    ledger.update()
+    assert client.get_account_activities.call_count == 1
+    assert ledger.synced_until('1') == lookback.isoformat()
+
+    client.reset_mock()
+    ledger.update()
+    assert client.get_account_activities.call_count == 1
+    _, start_time, end_time = client.get_account_activities.call_args[0]
+    assert start_time == questrade._start_of_local_day(lookback)
+    assert end_time == \
+        questrade._start_of_local_day(today + timedelta(days=1))
+    assert ledger.synced_until('1') == lookback.isoformat()
+
+
+@patch.object(questrade, 'LEDGER_REQUEST_DELAY', 0)
+def test_ledger_late_activities(hass, tmpdir):
+    client = create_client()
+    today = dt_util.now().date()
+    ledger = create_ledger(hass, tmpdir, client, today)
+    ledger.update()
+
+    yesterday = (today - timedelta(days=1)).isoformat()
+    client.get_account_activities.return_value = {
+        'activities': [activity(yesterday, 'Dividends', 10.0, 'ABC')],
+    }
+    ledger.update()
+    assert ledger.total('1', questrade.LEDGER_DIVIDENDS, 'CAD') == 10.0
+
+
+@patch.object(questrade, 'LEDGER_REQUEST_DELAY', 0)
+def test_ledger_activity_outside_window(hass, tmpdir):
+    today = dt_util.now().date()
+    client = create_client([
+        activity('2019-01-15', 'Dividends', 10.0, 'ABC'),
+        activity('2019-01-15', 'Dividends', 10.0, 'ABC'),
+        activity('2019-01-16', 'Deposits', 1000.0),
+    ])
+    ledger = create_ledger(hass, tmpdir, client, today)
+    ledger.update()
+    ledger.update()
+    ledger.update()
+
+    assert ledger.total('1', questrade.LEDGER_DIVIDENDS, 'CAD') == 20.0
+    assert ledger.total('1', questrade.LEDGER_CONTRIBUTIONS, 'CAD') == 1000.0
+
+
+@patch.object(questrade, 'LEDGER_REQUEST_DELAY', 0)
+def test_ledger_empty_symbol(hass, tmpdir):
+    client = create_client([
+        activity('2019-01-15', 'Dividends', 10.0),
+    ])
+    ledger = create_ledger(hass, tmpdir, client, dt_util.now().date())
+    ledger.update()
+
+    assert ledger.total('1', questrade.LEDGER_DIVIDENDS, 'CAD') == 10.0
+    assert ledger.symbols('1', questrade.LEDGER_DIVIDENDS, 'CAD') == []
+
+
+@patch.object(questrade, 'LEDGER_REQUEST_DELAY', 0)
+def test_ledger_saves_only_changes(hass, tmpdir):
+    client = create_client([
+        activity('2019-01-15', 'Dividends', 10.0, 'ABC'),
+    ])
+    start_date = dt_util.now().date() - timedelta(days=100)
+    ledger = create_ledger(hass, tmpdir, client, start_date)
+    with patch.object(questrade, 'save_json') as mock_save_json, \
+            patch.object(ledger, '_build_index') as mock_build_index:
+        ledger.update()
+        assert mock_save_json.call_count == 1
+        assert mock_build_index.call_count == 1
+
+        ledger.update()
+        assert mock_save_json.call_count == 1
+        assert mock_build_index.call_count == 1
+
+
+@patch.object(questrade, 'LEDGER_REQUEST_DELAY', 0)
+def test_ledger_syncs_configured_accounts(hass, tmpdir):
+    client = create_client()
+    today = dt_util.now().date()
+    hass.config.config_dir = str(tmpdir)
+    questrade.QuestradeLedger(hass, client, ['1', '2'], today).update()
+
+    client.reset_mock()
+    questrade.QuestradeLedger(hass, client, ['2'], today).update()
+    assert [call[0][0] for call in
+            client.get_account_activities.call_args_list] == ['2']
+
+
+@patch.object(questrade, 'LEDGER_REQUEST_DELAY', 0)
+def test_ledger_rate_limit(hass, tmpdir):
+    client = create_client()
+    client.get_account_activities.side_effect = \
+        questrade.QuestradeRateLimitError(time.time() + 3600)
+    start_date = dt_util.now().date() - timedelta(days=1000)
+    ledger = create_ledger(hass, tmpdir, client, start_date)
+    ledger.update()
+    assert client.get_account_activities.call_count == 1
+    assert ledger.synced_until('1') == start_date.isoformat()
+
+    ledger.update()
+    assert client.get_account_activities.call_count == 1
+
+
+@patch.object(questrade, 'LEDGER_REQUEST_DELAY', 0)
+def test_ledger_total(hass, tmpdir):
+    today = dt_util.now().date()
+    client = create_client([
+        activity('2019-01-15', 'Dividends', 1.5, 'ABC'),
+        activity('2019-02-15', 'Dividends', 2.5, 'ABC'),
+        activity('2019-02-20', 'Dividends', 3.0, 'XYZ'),
+        activity('2019-03-01', 'Dividends', 5.0, 'XYZ', 'USD'),
+        activity('2019-03-01', 'Deposits', 1000.0),
+    ])
+    ledger = create_ledger(hass, tmpdir, client, today)
+    ledger.update()
+
+    def total(start=None, end=None, currency='CAD', symbol=None):
+        if start is not None:
+            start = dt_util.parse_date(start)
+        if end is not None:
+            end = dt_util.parse_date(end)
+        return ledger.total(
+            '1', questrade.LEDGER_DIVIDENDS, currency, start, end, symbol)
+
+    assert total() == 7.0
+    assert total('2019-02-01') == 5.5
+    assert total('2019-02-01', '2019-02-20') == 2.5
+    assert total('2019-01-15', '2019-01-16') == 1.5
+    assert total(symbol='ABC') == 4.0
+    assert total(currency='USD') == 5.0
+    assert ledger.currencies('1', questrade.LEDGER_DIVIDENDS) == \
+        ['CAD', 'USD']
+    assert ledger.symbols('1', questrade.LEDGER_DIVIDENDS, 'CAD') == \
+        ['ABC', 'XYZ']
+    assert ledger.total(
+        '1', questrade.LEDGER_CONTRIBUTIONS, 'CAD') == 1000.0
+
+
+def test_portfolio_replaces_account_balances():
+    portfolio = questrade.QuestradePortfolio(MagicMock(), 'CAD')
+    a = balances([('CAD', 50.1), ('USD', 0)])
+    b = balances([('CAD', 100.1), ('USD', 10)])
+    portfolio.update_account('1', a)
+    portfolio.update_account('2', balances([('CAD', 0.1)]))
+    portfolio.update_account('1', b)
+    portfolio.update_account('1', a)
+
+    assert portfolio.totals['CAD']['totalEquity'] == Decimal('50.2')
+    assert portfolio.totals['USD']['totalEquity'] == Decimal('0')
+
+
+def test_portfolio_quoted_rate():
+    client = create_quoting_client()
+    response = balances([('CAD', 100), ('USD', 10)])
+
+    portfolio = questrade.QuestradePortfolio(client, 'CAD')
+    portfolio.update_account('1', response)
+    portfolio.update_exchange_rate()
+    totals, currencies, rates, missing = portfolio.convert()
+    assert totals['totalEquity'] == Decimal('113.7')
+    assert currencies == {'CAD': Decimal(100), 'USD': Decimal(10)}
+    assert rates == {'CAD': Decimal(1), 'USD': Decimal('1.37')}
+    assert missing == []
+
+    portfolio = questrade.QuestradePortfolio(client, 'USD')
+    portfolio.update_account('1', response)
+    portfolio.update_exchange_rate()
+    totals, _, _, _ = portfolio.convert()
+    assert round(totals['totalEquity'], 2) == Decimal('82.99')
+
+
+def test_portfolio_implied_rate():
+    client = MagicMock()
+    client.get_symbols.return_value = {'message': 'Error'}
+    portfolio = questrade.QuestradePortfolio(client, 'CAD')
+    portfolio.update_account('1', balances(
+        [('CAD', 100), ('USD', 10)], [('CAD', 137), ('USD', 100)]))
+    portfolio.update_exchange_rate()
+    totals, _, rates, missing = portfolio.convert()
+    assert totals['totalEquity'] == Decimal('113.7')
+    assert rates['USD'] == Decimal('1.37')
+    assert missing == []
+
+
+def test_portfolio_rate_fetched_once_per_day():
+    client = create_quoting_client()
+    portfolio = questrade.QuestradePortfolio(client, 'CAD')
+    portfolio.update_account('1', balances([('CAD', 100), ('USD', 10)]))
+    now = dt_util.now()
+    with patch.object(questrade.dt_util, 'now', return_value=now):
+        portfolio.update_exchange_rate()
+        portfolio.update_exchange_rate()
+    assert client.get_symbols.call_count == 1
+
+    client.get_symbols.return_value = {}
+    now += timedelta(days=1)
+    with patch.object(questrade.dt_util, 'now', return_value=now):
+        portfolio.update_exchange_rate()
+        portfolio.update_exchange_rate()
+    assert client.get_symbols.call_count == 2
+
+
+def test_portfolio_sensor_unavailable_without_rate(hass):
+    client = MagicMock()
+    client.get_symbols.return_value = {}
+    portfolio = questrade.QuestradePortfolio(client, 'CAD')
+    portfolio_sensor = hass.loop.run_until_complete(hass.async_add_job(
+        questrade.QuestradePortfolioSensor, hass, portfolio))
+    portfolio.update_account('1', balances([('CAD', 100), ('USD', 0)]))
+    portfolio_sensor.update()
+    assert portfolio_sensor.available
+    assert portfolio_sensor.state == 100.0
+
+    portfolio.update_account('1', balances([('CAD', 100), ('USD', 10)]))
+    portfolio_sensor.update()
+    assert not portfolio_sensor.available
+
+
+def test_portfolio_exchange_rate_failure(hass):
+    client = MagicMock()
+    client.get_symbols.side_effect = \
+        questrade.QuestradeRateLimitError(time.time() + 3600)
+    response = balances(
+        [('CAD', 100), ('USD', 10)], [('CAD', 137), ('USD', 100)])
+    for balance in response['combinedBalances']:
+        balance['buyingPower'] = balance['maintenanceExcess'] = 0
+    response['sodCombinedBalances'] = response['combinedBalances']
+    client.get_account_balances.return_value = response
+
+    portfolio = questrade.QuestradePortfolio(client, 'CAD')
+    portfolio_sensor, account_sensor = hass.loop.run_until_complete(
+        hass.async_add_job(lambda: (
+            questrade.QuestradePortfolioSensor(hass, portfolio),
+            questrade.QuestradeSensor(
+                hass, client, '1', 'TFSA', 'CAD', portfolio),
+        )))
+    portfolio_sensor.schedule_update_ha_state = MagicMock()
+    portfolio.sensor = portfolio_sensor
+
+    account_sensor.update()
+    account_sensor.update()
+    assert account_sensor.total_equity == 137
+    assert client.get_symbols.call_count == 1
+    assert portfolio_sensor.available
+    assert portfolio_sensor.total_equity == 113.7
+
+
+@patch.object(questrade, 'LEDGER_REQUEST_DELAY', 0)
+@patch('custom_components.questrade.sensor.QuestradeClient')
+def test_setup_platform(mock_client, hass, tmpdir):
+    hass.config.config_dir = str(tmpdir)
+    hass.config.skip_pip = True
+    client = mock_client.return_value
+    client.get_accounts.return_value = {
+        'accounts': [{'number': '1', 'type': 'TFSA', 'status': 'Active'}],
+    }
+    balance = {
+        'currency': 'CAD',
+        'cash': 100.0,
+        'marketValue': 900.0,
+        'totalEquity': 1000.0,
+        'buyingPower': 100.0,
+        'maintenanceExcess': 100.0,
+    }
+    client.get_account_balances.return_value = {
+        'perCurrencyBalances': [balance],
+        'combinedBalances': [balance],
+        'sodCombinedBalances': [balance],
+    }
+    client.get_symbols.return_value = {}
+
+    config = {
+        'sensor': {
+            'platform': 'questrade',
+            'client_id': 'client id',
+            'refresh_token': 'token',
+            'ledger_start': '2019-01-01',
+        }
+    }
+    result = hass.loop.run_until_complete(
+        async_setup_component(hass, sensor.DOMAIN, config)
+    )
+    assert result
+    hass.loop.run_until_complete(hass.async_block_till_done())
+
+    state = hass.states.get('sensor.questrade_1')
+    assert state is not None
+    assert state.state == '1000.0'
+
+    state = hass.states.get('sensor.questrade_portfolio')
+    assert state is not None
+    assert state.state == '1000.0'
+
+    state = hass.states.get('sensor.questrade_1_dividends')
+    assert state is not None
+    assert state.state == '0'
+    assert not client.get_account_activities.called
+
+    hass.bus.async_fire(EVENT_HOMEASSISTANT_START)
+    hass.loop.run_until_complete(hass.async_block_till_done())
+    assert client.get_account_activities.called
+
+
+@patch('custom_components.questrade.sensor.QuestradeClient')
+def test_setup_platform_unsupported_currency(mock_client, hass, tmpdir):
+    hass.config.config_dir = str(tmpdir)
+    hass.config.skip_pip = True
+    config = {
+        'sensor': {
+            'platform': 'questrade',
+            'client_id': 'client id',
+            'refresh_token': 'token',
+            'currency': 'EUR',
+        }
+    }
+    hass.loop.run_until_complete(
+        async_setup_component(hass, sensor.DOMAIN, config)
+    )
+    assert not mock_client.called